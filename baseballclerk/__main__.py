@@ -1,23 +1,35 @@
 """Baseball Clerk live baseball updates for Reddit game threads."""
 
+from __future__ import annotations
+
 import argparse
 import datetime
 import json
 import logging
+import socket
 import time
-
-import praw
-from praw.models import Comment, Submission
+from typing import Callable, List, Optional, TYPE_CHECKING
 
 from baseballclerk import baseballbot
 from baseballclerk import comment
 from baseballclerk import datastore
+from baseballclerk import game
+from baseballclerk import metrics
 from baseballclerk import mlb
 from baseballclerk import savant
+from baseballclerk import util
+
+if TYPE_CHECKING:
+    from praw.models import Submission
 
 
 EVENTS = datastore.Table("event")
 COMMENTS = datastore.Table("comment")
+GAMES = game.Games([EVENTS, COMMENTS])
+
+# Set in worker mode, when several BaseballClerk processes share a database.
+GAME_LEASES: Optional[datastore.Leases] = None
+POST_CLAIMS: Optional[datastore.Leases] = None
 
 
 def _parse_args():
@@ -34,6 +46,41 @@ def _parse_args():
     return parser.parse_args()
 
 
+def _post_once(
+    key: str, post: Callable[..., dict], *args, **kwargs
+) -> Optional[dict]:
+    """Post a comment and store it under key, unless it was already posted by any worker."""
+    if COMMENTS.get(key):
+        return None
+    if POST_CLAIMS:
+        if not POST_CLAIMS.claim(key):
+            return None
+        # Another worker may have posted and stored it since the check above.
+        if COMMENTS.get(key):
+            POST_CLAIMS.release(key)
+            return None
+
+    try:
+        cmnt = post(*args, **kwargs)
+    except comment.DataObjectError as err:
+        logging.error(err)
+        if POST_CLAIMS:
+            POST_CLAIMS.release(key)
+        return None
+    except Exception as err:
+        # Keep the claim unless nothing was posted; it may have gone out on a
+        # timeout or failed after the reply, and then expires after claim_ttl.
+        if POST_CLAIMS and comment.is_rejected(err):
+            POST_CLAIMS.release(key)
+        raise
+
+    COMMENTS[key] = cmnt
+    if POST_CLAIMS:
+        # The stored comment is the durable record from here on.
+        POST_CLAIMS.release(key)
+    return cmnt
+
+
 def due_up(game_pk: str, gamechat: Submission):
     """Post gamechat linescore updates (due up batters, pitching changes, substitutions, etc.)."""
     due_up = mlb.due_up(game_pk)
@@ -41,13 +88,9 @@ def due_up(game_pk: str, gamechat: Submission):
         return
 
     key = f"dueup-{game_pk}-{gamechat.subreddit.display_name}-{due_up['inning']}-{due_up['inningHalf']}"
-    if due_up and not COMMENTS.get(key):
-        EVENTS[key] = due_up
-        try:
-            cmnt = comment.due_up(gamechat, due_up)
-            COMMENTS[key] = cmnt
-        except comment.DataObjectError as err:
-            logging.error(err)
+    EVENTS[key] = due_up
+    event_id = f"dueup-{game_pk}-{due_up['inning']}-{due_up['inningHalf']}"
+    _post_once(key, comment.due_up, gamechat, due_up, event_id=event_id)
 
 
 def play_by_play(game_pk: str, gamechat: Submission):
@@ -71,17 +114,23 @@ def play_by_play(game_pk: str, gamechat: Submission):
         if not play_result:
             continue
         if play_result == "strikeout":
-            try:
-                cmnt = comment.strikeout(gamechat, play)
-                COMMENTS[key] = cmnt
-            except comment.DataObjectError as err:
-                logging.error(err)
+            cmnt = _post_once(
+                key, comment.strikeout, gamechat, play, event_id=f"play-{game_pk}-{idx}"
+            )
         elif play_result == "home run":
-            try:
-                cmnt = comment.homerun(gamechat, play)
-                COMMENTS[key] = cmnt
-            except comment.DataObjectError as err:
-                logging.error(err)
+            cmnt = _post_once(
+                key, comment.homerun, gamechat, play, event_id=f"play-{game_pk}-{idx}"
+            )
+        else:
+            continue
+        if not cmnt:
+            continue
+
+        metrics.observe(
+            "detection_to_post",
+            (datetime.datetime.utcnow() - end_time).total_seconds(),
+            event=play_result,
+        )
 
 
 def exit_velocities(game_pk: str, gamechat: Submission):
@@ -109,53 +158,112 @@ def exit_velocities(game_pk: str, gamechat: Submission):
         )
 
         if xba > 0.80 and is_bip_out:
-            try:
-                cmnt = comment.robbed(gamechat, evo)
-                COMMENTS[key] = cmnt
-            except comment.DataObjectError as err:
-                logging.error(err)
+            _post_once(
+                key, comment.robbed, gamechat, evo, event_id=f"evo-{game_pk}-{idx}"
+            )
         elif xba < 0.20 and not is_bip_out and is_hit:
-            try:
-                cmnt = comment.boxscore_linedrive(gamechat, evo)
-                COMMENTS[key] = cmnt
-            except comment.DataObjectError as err:
-                logging.error(err)
+            _post_once(
+                key,
+                comment.boxscore_linedrive,
+                gamechat,
+                evo,
+                event_id=f"evo-{game_pk}-{idx}",
+            )
 
 
-def main():
-    """Write and post new BaseballClerk comments."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(levelname)s:%(module)s:%(filename)s:%(lineno)s:%(message)s",
+def _game_threads(subreddits: dict, max_games: Optional[int] = None) -> List[dict]:
+    """List the active game threads of the configured subreddits this process should run.
+
+    In worker mode, only game threads whose game lease this worker holds or can
+    claim, up to max_games games, preferring games it already holds.
+    """
+    game_threads = [
+        gt
+        for gt in baseballbot.active_game_threads()
+        if gt["subreddit"]["name"] in subreddits
+    ]
+    if not GAME_LEASES:
+        return game_threads
+
+    held = set(GAME_LEASES.held())
+    game_threads.sort(key=lambda gt: str(gt["gamePk"]) not in held)
+
+    claimed = set()
+    owned = []
+    for game_thread in game_threads:
+        game_pk = str(game_thread["gamePk"])
+        if game_pk not in claimed:
+            if max_games is not None and len(claimed) >= max_games:
+                continue
+            if not GAME_LEASES.acquire(game_pk):
+                continue
+            claimed.add(game_pk)
+        owned.append(game_thread)
+    return owned
+
+
+def _report_metrics(metrics_path: Optional[str] = None):
+    """Log the run metrics as JSON and optionally write them in Prometheus text format."""
+    metrics.cache_stats("util", **util.cache_info())
+    for table in (EVENTS, COMMENTS):
+        metrics.cache_stats(f"table_{table.table_name}", **table.cache_info())
+
+    logging.getLogger(__name__).info(
+        json.dumps({"msg": "BaseballClerk metrics.", **metrics.snapshot()})
     )
+    if metrics_path:
+        metrics.write_prometheus(metrics_path)
+
+
+def _run(config: dict):
+    """Post new comments for the configured subreddits' game threads and inboxes."""
+    global GAME_LEASES, POST_CLAIMS
 
     logger = logging.getLogger(__name__)
 
-    args = _parse_args()
-    config = args.config
+    # Metrics cover a single pass; they are reported after each one.
+    metrics.reset()
 
-    start_time = datetime.datetime.utcnow()
-    logger.info(
-        json.dumps(
-            {
-                "msg": "Starting BaseballClerk.",
-                "subreddits": list(config["subreddits"].keys()),
-                "start_time": start_time.isoformat(),
-            }
-        )
-    )
+    # Fetch fresh game thread lists and live game feeds for this pass.
+    util.new_pass()
 
     # Connect the datastore and create tables if not existing.
-    datastore.connect("BaseballClerk.db")
+    datastore.connect(config.get("database", "BaseballClerk.db"), timeout=30)
     EVENTS.create_if_needed()
     COMMENTS.create_if_needed()
 
-    for game_thread in baseballbot.active_game_threads():
-        subreddit_config = config["subreddits"].get(
+    for subreddit_config in config["subreddits"].values():
+        comment.set_templates(
+            subreddit_config["name"], subreddit_config.get("templates", {})
+        )
+
+    worker_config = config.get("worker")  # type: Optional[dict]
+    if worker_config is not None:
+        worker_id = worker_config.get("id", socket.gethostname())
+        GAME_LEASES = datastore.Leases(
+            "game_lease", worker_id, worker_config.get("lease_ttl", 180)
+        )
+        POST_CLAIMS = datastore.Leases(
+            "post_claim", worker_id, worker_config.get("claim_ttl", 600)
+        )
+        GAME_LEASES.create_if_needed()
+        POST_CLAIMS.create_if_needed()
+        POST_CLAIMS.prune()
+
+    # Imported here rather than at module load; see tests/test_imports.py.
+    # pylint: disable=import-outside-toplevel
+    import praw
+    from praw.models import Comment
+
+    game_threads = _game_threads(
+        config["subreddits"],
+        worker_config.get("max_games") if worker_config else None,
+    )
+    active = set()
+    for game_thread in game_threads:
+        subreddit_config = config["subreddits"][
             game_thread["subreddit"]["name"]
-        )  # type: dict
-        if not subreddit_config:
-            continue
+        ]  # type: dict
 
         logger.info(
             json.dumps(
@@ -172,12 +280,29 @@ def main():
         game_pk = game_thread["gamePk"]
         gamechat = reddit.submission(game_thread["postId"])
 
-        play_by_play(game_pk, gamechat)
-        exit_velocities(game_pk, gamechat)
-        due_up(game_pk, gamechat)
+        for stage in (play_by_play, exit_velocities, due_up):
+            # Heartbeat the game lease; stop if another worker took the game over.
+            if GAME_LEASES and not GAME_LEASES.acquire(str(game_pk)):
+                logger.warning(
+                    json.dumps({"msg": "Lost game lease.", "game_pk": game_pk})
+                )
+                active.discard(str(game_pk))
+                break
+            GAMES.add(game_pk)
+            active.add(str(game_pk))
+            with metrics.timer("stage", stage=stage.__name__, game_pk=game_pk):
+                stage(game_pk, gamechat)
 
         time.sleep(2)
 
+    # Hand the games back; a run that crashes leaves its leases to expire.
+    if GAME_LEASES:
+        for game_pk in GAME_LEASES.held():
+            GAME_LEASES.release(game_pk)
+
+    # Release cached state for games that are over or no longer ours.
+    GAMES.release_finished(active=active)
+
     for subreddit_config in config["subreddits"].values():
         praw_bot = subreddit_config["praw_bot"]
         reddit = praw.Reddit(praw_bot)
@@ -197,13 +322,48 @@ def main():
 
             if isinstance(item, Comment) and praw_bot.lower() in item.body.lower():
                 key = f"textface-{item.id}"
-                cmnt = comment.default_mention_reply(
-                    item, subreddit_config["default_replies"]
+                _post_once(
+                    key,
+                    comment.default_mention_reply,
+                    item,
+                    subreddit_config["default_replies"],
                 )
-                COMMENTS[key] = cmnt
 
             item.mark_read()  # Keep the inbox clean.
 
+    # Mention replies are stored for good; don't keep them buffered.
+    COMMENTS.evict(lambda key: key.startswith("textface-"))
+
+
+def main():
+    """Write and post new BaseballClerk comments."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(levelname)s:%(module)s:%(filename)s:%(lineno)s:%(message)s",
+    )
+
+    logger = logging.getLogger(__name__)
+
+    args = _parse_args()
+    config = args.config
+
+    start_time = datetime.datetime.utcnow()
+    logger.info(
+        json.dumps(
+            {
+                "msg": "Starting BaseballClerk.",
+                "subreddits": list(config["subreddits"].keys()),
+                "start_time": start_time.isoformat(),
+            }
+        )
+    )
+
+    try:
+        _run(config)
+    finally:
+        # Report even when the run fails, the slow or failing ticks matter most.
+        _report_metrics(config.get("metrics_path"))
+
     end_time = datetime.datetime.utcnow()
     elapsed = (end_time - start_time).total_seconds()
     logger.info(
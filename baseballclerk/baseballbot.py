@@ -14,7 +14,7 @@ def _get_game_threads(subreddit: Optional[str] = None) -> List[dict]:
         url = f"https://baseballbot.io/subreddits/{subreddit}/game_threads.json"
     else:
         url = "https://baseballbot.io/game_threads.json"
-    data = util.cached_request_json(url)
+    data = util.live_request_json(url)
     return data["data"]
 
 
@@ -1,19 +1,108 @@
 """Reddit comment handler."""
 
+from __future__ import annotations
+
+from collections import OrderedDict
+import functools
 import random
+import string
 import time
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from baseballclerk import metrics
 
-import backoff
-import praw
-import praw.exceptions
-from praw.models import Comment, Submission
+if TYPE_CHECKING:
+    from praw.models import Comment, Submission
 
 
 _BYLINE = "^^^[⚾](https://github.com/troxellophilus/baseball-clerk/issues)"
 
 _MAX_TRIES = 4
 
+# Default comment body templates by comment type, in str.format syntax.
+TEMPLATES = {
+    "strikeout": "# {k}\n\n**{pitcher}** strikes out **{batter}** on a **{count_b}-2** count with a **{speed} mph** {pitch_type}.\n\n{break_details}*Sequence ({pitch_count}):* {sequence}\n\n{byline}",
+    "homerun": "# HR\n\n**{batter}** {verb} a **{pitch_speed} mph {pitch_type}** from **{pitcher}** for a **{runs}-run** home run.\n\nLaunch Speed: **{speed} mph**. Launch Angle: **{angle}°**. Distance: **{distance} ft**.\n\n{byline}",
+    "due_up": "**Due Up ({half} {inning})**\n\n{batters_up}\n\n{byline}",
+    "robbed": "**Robbed**\n\n{desc}\n\nLaunch Speed: **{speed} mph**. Launch Angle: **{angle}°**. Distance: **{distance} ft**. Expected Batting Average: ***{xba}***.\n\n{byline}",
+    "boxscore_linedrive": "*Looks like a line drive in the box score...*\n\n{desc}\n\nLaunch Speed: **{speed} mph**. Launch Angle: **{angle}°**. Distance: **{distance} ft**. Expected Batting Average: ***{xba}***.\n\n{byline}",
+}
+
+# Subreddit template overrides by lowercase subreddit name, then comment type.
+_SUBREDDIT_TEMPLATES: Dict[str, Dict[str, str]] = {}
+
+# Rendered bodies by (comment type, event id, template), oldest first.
+_RENDERED: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+_MAX_RENDERED = 256
+
+_Compiled = Tuple[Tuple[str, Optional[str]], ...]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(kind: str, template: str) -> _Compiled:
+    """Compile a template into (literal, field) parts.
+
+    Fields are checked against the default template for the comment type. Format
+    specs and conversions are rejected, since field values may be numbers or
+    strings depending on the feed.
+    """
+    if kind not in TEMPLATES:
+        raise ValueError(f"Unknown comment type: {kind}")
+
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        if spec or conversion:
+            raise ValueError(
+                f"Unsupported format spec or conversion in {kind} template: {field}"
+            )
+        parts.append((literal, field))
+
+    if template != TEMPLATES[kind]:
+        allowed = {field for _, field in _compile(kind, TEMPLATES[kind])}
+        unknown = {field for _, field in parts if field is not None} - allowed
+        if unknown:
+            raise ValueError(f"Unknown fields in {kind} template: {sorted(unknown)}")
+
+    return tuple(parts)
+
+
+def set_templates(subreddit: str, templates: Dict[str, str]):
+    """Override comment body templates for a subreddit, by comment type."""
+    for kind, template in templates.items():
+        _compile(kind, template)
+    _SUBREDDIT_TEMPLATES[subreddit.lower()] = dict(templates)
+
+
+def _body(
+    gamechat: Submission, kind: str, event_id: Optional[str], values: Callable[[], dict]
+) -> str:
+    """Render the comment body for an event with the subreddit's template.
+
+    Memoized by event id and template, so an event posted to several game
+    threads with the same template is only rendered once.
+    """
+    subreddit = gamechat.subreddit.display_name.lower()
+    template = _SUBREDDIT_TEMPLATES.get(subreddit, {}).get(kind, TEMPLATES[kind])
+
+    memo_key = (kind, event_id, template)
+    if event_id is not None and memo_key in _RENDERED:
+        return _RENDERED[memo_key]
+
+    fields = dict(values(), byline=_BYLINE)
+    try:
+        body = "".join(
+            literal + (format(fields[field]) if field is not None else "")
+            for literal, field in _compile(kind, template)
+        )
+    except (ValueError, TypeError) as err:
+        raise DataObjectError(f"{err.__class__.__name__}: {err}")
+
+    if event_id is not None:
+        _RENDERED[memo_key] = body
+        if len(_RENDERED) > _MAX_RENDERED:
+            _RENDERED.popitem(last=False)
+    return body
+
 
 def _build_obj(comment: Comment):
     """Build a datastore-able dict for a comment."""
@@ -26,6 +115,47 @@ def _build_obj(comment: Comment):
     }
 
 
+def _reply(parent, body: str, kind: str) -> Comment:
+    """Reply to a submission or comment, recording the post latency."""
+    with metrics.timer("comment_post", type=kind):
+        comment = parent.reply(body)
+    metrics.incr("comments_posted", type=kind)
+    return comment
+
+
+def _with_retries(func):
+    """Retry a comment function with exponential backoff on Reddit API errors.
+
+    backoff and praw are imported on first call rather than at module load.
+    """
+    retrying = None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal retrying
+        if retrying is None:
+            # pylint: disable=import-outside-toplevel
+            import backoff
+            import praw.exceptions
+
+            retrying = backoff.on_exception(
+                backoff.expo,
+                praw.exceptions.APIException,
+                max_tries=_MAX_TRIES,
+                jitter=None,
+            )(func)
+        return retrying(*args, **kwargs)
+
+    return wrapper
+
+
+def is_rejected(err: Exception) -> bool:
+    """Check if an error from a comment function means Reddit refused the comment."""
+    import praw.exceptions  # pylint: disable=import-outside-toplevel
+
+    return isinstance(err, praw.exceptions.APIException)
+
+
 class _Err(Exception):
     pass
 
@@ -36,19 +166,7 @@ class DataObjectError(_Err):
     pass
 
 
-@backoff.on_exception(
-    backoff.expo, praw.exceptions.APIException, max_tries=_MAX_TRIES, jitter=None
-)
-def strikeout(gamechat: Submission, play: dict) -> dict:
-    """Post a comment to the game thread for a strikeout play.
-
-    Args:
-        gamechat (Submission): The destination game thread.
-        play (dict): The strikeout play data.
-
-    Returns:
-        dict: The posted comment metadata as a datastore-able dict.
-    """
+def _strikeout_values(play: dict) -> dict:
     try:
         pitcher = play["matchup"]["pitcher"]["fullName"]
         batter = play["matchup"]["batter"]["fullName"]
@@ -65,11 +183,14 @@ def strikeout(gamechat: Submission, play: dict) -> dict:
         spin_rate = breaks.get("spinRate")
         break_length = breaks.get("breakLength")
 
-        pitch_details = [e["details"] for e in play["playEvents"] if "pitchData" in e]
-        sequence = ", ".join(
-            f"{d['type']['code']} *({d['code'].strip('*').lower()})*"
-            for d in pitch_details
-        )
+        # Build the pitch sequence in a single pass over the play events.
+        sequence = []
+        for pitch in play["playEvents"]:
+            if "pitchData" in pitch:
+                details = pitch["details"]
+                sequence.append(
+                    f"{details['type']['code']} *({details['code'].strip('*').lower()})*"
+                )
     except (KeyError, AttributeError) as err:
         raise DataObjectError(f"{err.__class__.__name__}: {err}")
 
@@ -80,29 +201,42 @@ def strikeout(gamechat: Submission, play: dict) -> dict:
     else:
         break_details = ""
 
-    body = f"# {k}\n\n**{pitcher}** strikes out **{batter}** on a **{count_b}-2** count with a **{speed} mph** {pitch_type}.\n\n{break_details}*Sequence ({len(pitch_details)}):* {sequence}\n\n{_BYLINE}"
-    comment = gamechat.reply(body)
-
-    return _build_obj(comment)
-
-
-# Constant set of verbs to choose from for home runs.
-DONGER_VERBS = ["cracks", "smashes", "crushes", "rips", "hammers", "socks", "nails"]
+    return {
+        "k": k,
+        "pitcher": pitcher,
+        "batter": batter,
+        "count_b": count_b,
+        "speed": speed,
+        "pitch_type": pitch_type,
+        "break_details": break_details,
+        "pitch_count": len(sequence),
+        "sequence": ", ".join(sequence),
+    }
 
 
-@backoff.on_exception(
-    backoff.expo, praw.exceptions.APIException, max_tries=_MAX_TRIES, jitter=None
-)
-def homerun(gamechat: Submission, play: dict) -> dict:
-    """Post a comment to the game thread for a homerun play.
+@_with_retries
+def strikeout(gamechat: Submission, play: dict, event_id: Optional[str] = None) -> dict:
+    """Post a comment to the game thread for a strikeout play.
 
     Args:
         gamechat (Submission): The destination game thread.
-        play (dict): The homerun play data.
+        play (dict): The strikeout play data.
+        event_id (str, optional): Identifies the play across game threads.
 
     Returns:
         dict: The posted comment metadata as a datastore-able dict.
     """
+    body = _body(gamechat, "strikeout", event_id, lambda: _strikeout_values(play))
+    comment = _reply(gamechat, body, "strikeout")
+
+    return _build_obj(comment)
+
+
+# Constant set of verbs to choose from for home runs.
+DONGER_VERBS = ["cracks", "smashes", "crushes", "rips", "hammers", "socks", "nails"]
+
+
+def _homerun_values(play: dict) -> dict:
     try:
         pitcher = play["matchup"]["pitcher"]["fullName"]
         batter = play["matchup"]["batter"]["fullName"]
@@ -117,25 +251,38 @@ def homerun(gamechat: Submission, play: dict) -> dict:
     except (KeyError, AttributeError) as err:
         raise DataObjectError(f"{err.__class__.__name__}: {err}")
 
-    body = f"# HR\n\n**{batter}** {random.choice(DONGER_VERBS)} a **{pitch_speed} mph {pitch_type}** from **{pitcher}** for a **{runs}-run** home run.\n\nLaunch Speed: **{speed} mph**. Launch Angle: **{angle}°**. Distance: **{distance} ft**.\n\n{_BYLINE}"
-    comment = gamechat.reply(body)
-
-    return _build_obj(comment)
+    return {
+        "batter": batter,
+        "verb": random.choice(DONGER_VERBS),
+        "pitch_speed": pitch_speed,
+        "pitch_type": pitch_type,
+        "pitcher": pitcher,
+        "runs": runs,
+        "speed": speed,
+        "angle": angle,
+        "distance": distance,
+    }
 
 
-@backoff.on_exception(
-    backoff.expo, praw.exceptions.APIException, max_tries=_MAX_TRIES, jitter=None
-)
-def due_up(gamechat: Submission, due_up: dict) -> dict:
-    """Post a comment to the game thread for the players due up.
+@_with_retries
+def homerun(gamechat: Submission, play: dict, event_id: Optional[str] = None) -> dict:
+    """Post a comment to the game thread for a homerun play.
 
     Args:
         gamechat (Submission): The destination game thread.
-        due_up (dict): The due up players data.
+        play (dict): The homerun play data.
+        event_id (str, optional): Identifies the play across game threads.
 
     Returns:
         dict: The posted comment metadata as a datastore-able dict.
     """
+    body = _body(gamechat, "homerun", event_id, lambda: _homerun_values(play))
+    comment = _reply(gamechat, body, "homerun")
+
+    return _build_obj(comment)
+
+
+def _due_up_values(due_up: dict) -> dict:
     try:
         inning = due_up["inning"]
         half = due_up["inningHalf"]
@@ -148,72 +295,77 @@ def due_up(gamechat: Submission, due_up: dict) -> dict:
     except KeyError as err:
         raise DataObjectError(f"{err.__class__.__name__}: {err}")
 
-    batters_up_str = "\n\n".join(batters_up)
-    body = f"**Due Up ({half[:3]} {inning})**\n\n{batters_up_str}\n\n{_BYLINE}"
-    comment = gamechat.reply(body)
-
-    return _build_obj(comment)
+    return {"half": half[:3], "inning": inning, "batters_up": "\n\n".join(batters_up)}
 
 
-@backoff.on_exception(
-    backoff.expo, praw.exceptions.APIException, max_tries=_MAX_TRIES, jitter=None
-)
-def robbed(gamechat: Submission, evo: dict):
-    """Post a comment to the game thread for a robbed hit.
+@_with_retries
+def due_up(gamechat: Submission, due_up: dict, event_id: Optional[str] = None) -> dict:
+    """Post a comment to the game thread for the players due up.
 
     Args:
         gamechat (Submission): The destination game thread.
-        evo (dict): The exit velocity data of the play.
+        due_up (dict): The due up players data.
+        event_id (str, optional): Identifies the due up across game threads.
 
     Returns:
         dict: The posted comment metadata as a datastore-able dict.
     """
+    body = _body(gamechat, "due_up", event_id, lambda: _due_up_values(due_up))
+    comment = _reply(gamechat, body, "due_up")
+
+    return _build_obj(comment)
+
+
+def _evo_values(evo: dict) -> dict:
     try:
-        desc = evo["des"]
-        speed = evo["hit_speed"]
-        angle = evo["hit_angle"]
-        distance = evo["hit_distance"]
-        xba = evo["xba"]
+        return {
+            "desc": evo["des"],
+            "speed": evo["hit_speed"],
+            "angle": evo["hit_angle"],
+            "distance": evo["hit_distance"],
+            "xba": evo["xba"],
+        }
     except KeyError as err:
         raise DataObjectError(f"{err.__class__.__name__}: {err}")
 
-    body = f"**Robbed**\n\n{desc}\n\nLaunch Speed: **{speed} mph**. Launch Angle: **{angle}°**. Distance: **{distance} ft**. Expected Batting Average: ***{xba}***.\n\n{_BYLINE}"
-    comment = gamechat.reply(body)
+
+@_with_retries
+def robbed(gamechat: Submission, evo: dict, event_id: Optional[str] = None):
+    """Post a comment to the game thread for a robbed hit.
+
+    Args:
+        gamechat (Submission): The destination game thread.
+        evo (dict): The exit velocity data of the play.
+        event_id (str, optional): Identifies the play across game threads.
+
+    Returns:
+        dict: The posted comment metadata as a datastore-able dict.
+    """
+    body = _body(gamechat, "robbed", event_id, lambda: _evo_values(evo))
+    comment = _reply(gamechat, body, "robbed")
 
     return _build_obj(comment)
 
 
-@backoff.on_exception(
-    backoff.expo, praw.exceptions.APIException, max_tries=_MAX_TRIES, jitter=None
-)
-def boxscore_linedrive(gamechat: Submission, evo: dict):
+@_with_retries
+def boxscore_linedrive(gamechat: Submission, evo: dict, event_id: Optional[str] = None):
     """Post a comment to the game thread for a low hp hit.
 
     Args:
         gamechat (Submission): The destination game thread.
         evo (dict): The exit velocity data of the play.
+        event_id (str, optional): Identifies the play across game threads.
 
     Returns:
         dict: The posted comment metadata as a datastore-able dict.
     """
-    try:
-        desc = evo["des"]
-        speed = evo["hit_speed"]
-        angle = evo["hit_angle"]
-        distance = evo["hit_distance"]
-        xba = evo["xba"]
-    except KeyError as err:
-        raise DataObjectError(f"{err.__class__.__name__}: {err}")
-
-    body = f"*Looks like a line drive in the box score...*\n\n{desc}\n\nLaunch Speed: **{speed} mph**. Launch Angle: **{angle}°**. Distance: **{distance} ft**. Expected Batting Average: ***{xba}***.\n\n{_BYLINE}"
-    comment = gamechat.reply(body)
+    body = _body(gamechat, "boxscore_linedrive", event_id, lambda: _evo_values(evo))
+    comment = _reply(gamechat, body, "boxscore_linedrive")
 
     return _build_obj(comment)
 
 
-@backoff.on_exception(
-    backoff.expo, praw.exceptions.APIException, max_tries=_MAX_TRIES, jitter=None
-)
+@_with_retries
 def default_mention_reply(message: Comment, choices: List[str]) -> dict:
     """Post a random selection of choices as a reply to a message.
 
@@ -225,5 +377,5 @@ def default_mention_reply(message: Comment, choices: List[str]) -> dict:
         dict: The posted comment metadata as a datastore-able dict.
     """
     body = f"{random.choice(choices)}"
-    comment = message.reply(body)
+    comment = _reply(message, body, "default_mention_reply")
     return _build_obj(comment)
@@ -7,7 +7,10 @@ from collections.abc import MutableMapping
 import json
 import sqlite3
 import string
-from typing import Generator, Optional
+import time
+from typing import Callable, Generator, List, Optional
+
+from baseballclerk import metrics
 
 
 _CON: Optional[sqlite3.Connection] = None
@@ -34,7 +37,7 @@ def _safety_first(table: str):
 def read(table: str, key: str):
     """Read a single row by key."""
     _safety_first(table)
-    with _connection() as conn:
+    with metrics.timer("datastore_read", table=table), _connection() as conn:
         cur = conn.cursor()
         cur.execute(f"SELECT * FROM {table} WHERE key = ?", (key,))
         row = cur.fetchone()
@@ -53,7 +56,7 @@ def create_table(table: str):
 def write(table: str, key: str, data: str):
     """Write data to a table."""
     _safety_first(table)
-    with _connection() as conn:
+    with metrics.timer("datastore_write", table=table), _connection() as conn:
         conn.execute(
             f"INSERT OR REPLACE INTO {table}(key, data) VALUES(?, ?);", (key, data)
         )
@@ -89,6 +92,113 @@ def delete(table: str, key: str):
         conn.execute(f"DELETE FROM {table} WHERE key = ?;", (key,))
 
 
+def create_lease_table(table: str):
+    """Create a table for key-owner leases."""
+    _safety_first(table)
+    with _connection() as conn:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table}(key text PRIMARY KEY, owner TEXT, expires REAL)"
+        )
+
+
+def acquire_lease(table: str, key: str, owner: str, ttl: float) -> bool:
+    """Acquire or renew a lease on a key, unless another owner holds it unexpired."""
+    _safety_first(table)
+    now = time.time()
+    with _connection() as conn:
+        cur = conn.execute(
+            f"INSERT INTO {table}(key, owner, expires) VALUES(?, ?, ?) "
+            f"ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            f"WHERE {table}.owner = excluded.owner OR {table}.expires < ?;",
+            (key, owner, now + ttl, now),
+        )
+        acquired = cur.rowcount > 0
+    return acquired
+
+
+def claim_lease(table: str, key: str, owner: str, ttl: float) -> bool:
+    """Claim a lease on a key only if it is unheld or expired, even for its owner."""
+    _safety_first(table)
+    now = time.time()
+    with _connection() as conn:
+        cur = conn.execute(
+            f"INSERT INTO {table}(key, owner, expires) VALUES(?, ?, ?) "
+            f"ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            f"WHERE {table}.expires < ?;",
+            (key, owner, now + ttl, now),
+        )
+        claimed = cur.rowcount > 0
+    return claimed
+
+
+def release_lease(table: str, key: str, owner: str):
+    """Release a lease on a key if held by owner."""
+    _safety_first(table)
+    with _connection() as conn:
+        conn.execute(f"DELETE FROM {table} WHERE key = ? AND owner = ?;", (key, owner))
+
+
+def prune_leases(table: str):
+    """Delete expired leases."""
+    _safety_first(table)
+    with _connection() as conn:
+        conn.execute(f"DELETE FROM {table} WHERE expires < ?;", (time.time(),))
+
+
+def held_leases(table: str, owner: str) -> List[str]:
+    """List the keys of unexpired leases held by owner."""
+    _safety_first(table)
+    with _connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT key FROM {table} WHERE owner = ? AND expires >= ?;",
+            (owner, time.time()),
+        )
+        rows = cur.fetchall()
+    return [row[0] for row in rows]
+
+
+class Leases:
+    """Expiring key leases for coordinating workers sharing a database.
+
+    A lease is held by one owner until it expires; the holder renews it by
+    acquiring it again before then, and any owner may take it over after.
+    Claiming instead never renews, so a key is claimed at most once per ttl.
+        >>> games = Leases('game_lease', 'worker-1', ttl=120)
+        >>> if games.acquire('717465'):
+        >>>     print("Ours")
+    """
+
+    def __init__(self, name: str, owner: str, ttl: float):
+        self.table_name = name
+        self.owner = owner
+        self.ttl = ttl
+
+    def create_if_needed(self):
+        """Create the table on the database."""
+        create_lease_table(self.table_name)
+
+    def acquire(self, key: str) -> bool:
+        """Acquire or renew the lease on a key."""
+        return acquire_lease(self.table_name, key, self.owner, self.ttl)
+
+    def claim(self, key: str) -> bool:
+        """Claim the lease on a key if unheld or expired, without renewing."""
+        return claim_lease(self.table_name, key, self.owner, self.ttl)
+
+    def release(self, key: str):
+        """Release the lease on a key."""
+        release_lease(self.table_name, key, self.owner)
+
+    def prune(self):
+        """Delete expired leases, whoever held them."""
+        prune_leases(self.table_name)
+
+    def held(self) -> List[str]:
+        """List the keys this owner currently holds."""
+        return held_leases(self.table_name, self.owner)
+
+
 class Table(MutableMapping):
     """A key-dict persistence table.
 
@@ -107,15 +217,28 @@ class Table(MutableMapping):
     def __init__(self, name: str):
         self.table_name = name
         self._buf = {}
+        self._hits = 0
+        self._misses = 0
 
     def create_if_needed(self):
         """Create the table on the database."""
         create_table(self.table_name)
 
+    def cache_info(self) -> dict:
+        """Get the read buffer hit and miss counts."""
+        return {"hits": self._hits, "misses": self._misses}
+
+    def evict(self, match: Callable[[str], bool]):
+        """Drop buffered items with matching keys; they stay in the database."""
+        for key in [k for k in self._buf if match(k)]:
+            del self._buf[key]
+
     def __getitem__(self, key):
         try:
             item = self._buf[key]
+            self._hits += 1
         except KeyError:
+            self._misses += 1
             row = read(self.table_name, key)
             if not row:
                 raise KeyError
@@ -124,8 +247,7 @@ class Table(MutableMapping):
 
     def __setitem__(self, key, item):
         write(self.table_name, key, json.dumps(item))
-        if self[key]:
-            del self._buf[key]
+        self._buf.pop(key, None)
 
     def __delitem__(self, key):
         delete(self.table_name, key)
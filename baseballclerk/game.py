@@ -0,0 +1,50 @@
+"""Live game lifecycle.
+
+Tracks the games a process is running so that per-game cached lookups and
+buffered rows are released once a game is over.
+"""
+
+from typing import Iterable, Set
+
+from baseballclerk import datastore
+from baseballclerk import mlb
+from baseballclerk import util
+
+
+class Games:
+    """The live games of a process, bounded by the games still being run.
+
+        >>> games = Games([EVENTS, COMMENTS])
+        >>> games.add('717465')
+        >>> games.release_finished(active=['717465'])
+    """
+
+    def __init__(self, tables: Iterable[datastore.Table]):
+        self._tables = list(tables)
+        self._game_pks: Set[str] = set()
+
+    def add(self, game_pk: str):
+        """Track a game being run."""
+        self._game_pks.add(str(game_pk))
+
+    def release(self, game_pk: str):
+        """Release a game's cached lookups and buffered rows.
+
+        Table writes go straight to the database, so nothing is lost.
+        """
+        game_pk = str(game_pk)
+        util.release(game_pk)
+        for table in self._tables:
+            table.evict(lambda key: f"-{game_pk}-" in key)
+        self._game_pks.discard(game_pk)
+
+    def release_finished(self, active: Iterable[str] = ()):
+        """Release games that are over or no longer active."""
+        active = {str(game_pk) for game_pk in active}
+        for game_pk in list(self._game_pks):
+            if game_pk in active and not mlb.is_final(game_pk):
+                continue
+            self.release(game_pk)
+
+    def __len__(self):
+        return len(self._game_pks)
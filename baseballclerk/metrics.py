@@ -0,0 +1,128 @@
+"""Run metrics.
+
+In-process counters, gauges and timings for a BaseballClerk run. Snapshot as
+a JSON-able dict or render in the Prometheus text exposition format.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+import os
+import time
+from typing import Dict, Iterator, Tuple
+
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_COUNTERS: Dict[_Key, float] = defaultdict(float)
+_GAUGES: Dict[_Key, float] = {}
+_TIMINGS: Dict[_Key, Dict[str, float]] = {}
+
+
+def _key(name: str, labels: dict) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def incr(name: str, value: float = 1, **labels):
+    """Increment a counter."""
+    _COUNTERS[_key(name, labels)] += value
+
+
+def gauge(name: str, value: float, **labels):
+    """Set a gauge to a value."""
+    _GAUGES[_key(name, labels)] = value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record a timing observation in seconds."""
+    timing = _TIMINGS.setdefault(
+        _key(name, labels), {"count": 0, "sum": 0.0, "max": 0.0}
+    )
+    timing["count"] += 1
+    timing["sum"] += seconds
+    timing["max"] = max(timing["max"], seconds)
+
+
+@contextmanager
+def timer(name: str, **labels) -> Iterator[None]:
+    """Time the wrapped block as an observation of name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def cache_stats(cache: str, hits: int, misses: int):
+    """Set the hit, miss and hit rate gauges for a cache."""
+    total = hits + misses
+    gauge("cache_hits", hits, cache=cache)
+    gauge("cache_misses", misses, cache=cache)
+    gauge("cache_hit_rate", hits / total if total else 0.0, cache=cache)
+
+
+def reset():
+    """Clear all recorded metrics."""
+    _COUNTERS.clear()
+    _GAUGES.clear()
+    _TIMINGS.clear()
+
+
+def snapshot() -> dict:
+    """Get the recorded metrics as a JSON-able dict."""
+
+    def entries(metrics: dict) -> list:
+        return [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(metrics.items())
+        ]
+
+    return {
+        "counters": entries(_COUNTERS),
+        "gauges": entries(_GAUGES),
+        "timings": entries(_TIMINGS),
+    }
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def to_prometheus() -> str:
+    """Render the recorded metrics in the Prometheus text exposition format."""
+    lines = []
+
+    def family(metrics: dict, kind: str, suffix: str = ""):
+        seen = set()
+        for (name, labels), value in sorted(metrics.items()):
+            metric = f"baseballclerk_{name}{suffix}"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+            yield metric, labels, value
+
+    for metric, labels, value in family(_COUNTERS, "counter", "_total"):
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for metric, labels, value in family(_GAUGES, "gauge"):
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for metric, labels, timing in family(_TIMINGS, "summary", "_seconds"):
+        lines.append(f"{metric}_count{_format_labels(labels)} {timing['count']}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {timing['sum']}")
+    for metric, labels, timing in family(_TIMINGS, "gauge", "_seconds_max"):
+        lines.append(f"{metric}{_format_labels(labels)} {timing['max']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(filepath: str):
+    """Write the Prometheus text metrics to a file (e.g. for a textfile collector)."""
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as metrics_fo:
+        metrics_fo.write(to_prometheus())
+    # Replace atomically so a scraper never reads a partial file.
+    os.replace(tmp_path, filepath)
@@ -5,16 +5,37 @@ from typing import List, Optional
 from baseballclerk import util
 
 
-def _get_path(path: str) -> dict:
-    """Cached request a statsapi url."""
+# Status codes of games that are over (final, postponed).
+_FINAL_STATUS_CODES = ("f", "d", "di")
+
+
+def _get_path(path: str, game_pk: str) -> dict:
+    """Cached request a statsapi url for a game."""
     url = f"https://statsapi.mlb.com{path}"
-    return util.cached_request_json(url)
+    return util.cached_request_json(url, scope=str(game_pk))
 
 
 def _get_gumbo(game_pk: str) -> dict:
-    """Return a 'gumbo' live game feed."""
-    path = f"/api/v1.1/game/{game_pk}/feed/live"
-    return _get_path(path)
+    """Return a 'gumbo' live game feed, fetched fresh each pass."""
+    return util.live_request_json(
+        f"https://statsapi.mlb.com/api/v1.1/game/{game_pk}/feed/live"
+    )
+
+
+def is_final(game_pk: str) -> bool:
+    """Check if a game is over.
+
+    Args:
+        game_pk (str)
+
+    Returns:
+        bool: True if the game is final, postponed or otherwise over.
+    """
+    status = _get_gumbo(game_pk)["gameData"]["status"]
+    return (
+        status.get("abstractGameState") == "Final"
+        or status["statusCode"].lower() in _FINAL_STATUS_CODES
+    )
 
 
 def completed_plays(game_pk: str) -> List[dict]:
@@ -43,7 +64,7 @@ def due_up(game_pk: str) -> Optional[dict]:
     gumbo = _get_gumbo(game_pk)
 
     game_state = gumbo["gameData"]["status"]["statusCode"].lower()
-    if game_state in ("f", "s", "di", "d"):
+    if game_state in _FINAL_STATUS_CODES + ("s",):
         return None
 
     linescore = gumbo["liveData"]["linescore"]
@@ -76,9 +97,9 @@ def due_up(game_pk: str) -> Optional[dict]:
     due_up = {"inning": inning, "inningHalf": inning_half}
 
     batter_profiles = [
-        _get_path(linescore["offense"]["batter"]["link"])["people"][0],
-        _get_path(linescore["offense"]["onDeck"]["link"])["people"][0],
-        _get_path(linescore["offense"]["inHole"]["link"])["people"][0],
+        _get_path(linescore["offense"]["batter"]["link"], game_pk)["people"][0],
+        _get_path(linescore["offense"]["onDeck"]["link"], game_pk)["people"][0],
+        _get_path(linescore["offense"]["inHole"]["link"], game_pk)["people"][0],
     ]
 
     batters = []
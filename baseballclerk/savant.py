@@ -8,7 +8,7 @@ from baseballclerk import util
 def _get_savant_gamefeed(game_pk: str) -> dict:
     """Get the game feed for a game."""
     url = f"https://baseballsavant.mlb.com/gf?game_pk={game_pk}"
-    return util.cached_request_json(url)
+    return util.live_request_json(url)
 
 
 def exit_velocities(game_pk: str) -> List[dict]:
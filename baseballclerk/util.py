@@ -1,18 +1,76 @@
 """Helpers."""
 
-from functools import lru_cache
-
-import httpx
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlsplit
 
 from baseballclerk import __version__
+from baseballclerk import metrics
+
+
+# Cached responses by scope (e.g. a game_pk), then url, least recently used first.
+_CACHE: Dict[Optional[str], "OrderedDict[str, dict]"] = {}
+_MAX_SCOPE_SIZE = 128
+
+# Live feed responses, cached for the current pass only.
+_LIVE_CACHE: Dict[str, dict] = {}
+
+_CACHE_STATS = {"hits": 0, "misses": 0}
 
 
-@lru_cache()
-def cached_request_json(url: str) -> dict:
-    """Send a get request to a url, LRU cached."""
+def _request_json(url: str) -> dict:
+    """Send a get request to a url."""
+    import httpx  # pylint: disable=import-outside-toplevel
+
     headers = {
         "User-Agent": f"BaseballClerk/{__version__} (+https://github.com/troxellophilus/baseball-clerk)"
     }
-    response = httpx.get(url, headers=headers)
+    host = urlsplit(url).hostname
+    with metrics.timer("http_fetch", host=host):
+        response = httpx.get(url, headers=headers)
+    metrics.incr("http_responses", host=host, status=response.status_code)
     response.raise_for_status()
-    return response.json()
+    with metrics.timer("json_decode", host=host):
+        data = response.json()
+    return data
+
+
+def cached_request_json(url: str, scope: Optional[str] = None) -> dict:
+    """Send a get request to a url, LRU cached until its scope is released."""
+    cache = _CACHE.setdefault(scope, OrderedDict())
+    if url in cache:
+        _CACHE_STATS["hits"] += 1
+        cache.move_to_end(url)
+        return cache[url]
+    _CACHE_STATS["misses"] += 1
+
+    data = cache[url] = _request_json(url)
+    if len(cache) > _MAX_SCOPE_SIZE:
+        cache.popitem(last=False)
+    return data
+
+
+def live_request_json(url: str) -> dict:
+    """Send a get request to a url for a live feed, cached until the next pass."""
+    if url in _LIVE_CACHE:
+        _CACHE_STATS["hits"] += 1
+        return _LIVE_CACHE[url]
+    _CACHE_STATS["misses"] += 1
+
+    data = _LIVE_CACHE[url] = _request_json(url)
+    return data
+
+
+def new_pass():
+    """Drop the live feed responses so the next requests fetch fresh data."""
+    _LIVE_CACHE.clear()
+
+
+def release(scope: str):
+    """Drop the cached responses for a scope."""
+    _CACHE.pop(scope, None)
+
+
+def cache_info() -> dict:
+    """Get the request cache hit and miss counts."""
+    return dict(_CACHE_STATS)
@@ -0,0 +1,69 @@
+"""Tests for datastore leases."""
+
+import unittest
+from unittest import mock
+
+from baseballclerk import datastore
+
+
+class LeasesTest(unittest.TestCase):
+    def setUp(self):
+        datastore.connect(":memory:")
+        self.worker_a = datastore.Leases("lease", "a", ttl=60)
+        self.worker_b = datastore.Leases("lease", "b", ttl=60)
+        self.worker_a.create_if_needed()
+
+    def _later(self, seconds: float):
+        now = datastore.time.time()
+        return mock.patch.object(datastore.time, "time", return_value=now + seconds)
+
+    def test_acquire(self):
+        self.assertTrue(self.worker_a.acquire("1"))
+        self.assertFalse(self.worker_b.acquire("1"))
+
+    def test_acquire_renews_own_lease(self):
+        self.worker_a.acquire("1")
+        with self._later(45):
+            self.assertTrue(self.worker_a.acquire("1"))
+        with self._later(90):
+            self.assertFalse(self.worker_b.acquire("1"))
+
+    def test_takeover_after_expiry(self):
+        self.worker_a.acquire("1")
+        with self._later(61):
+            self.assertTrue(self.worker_b.acquire("1"))
+            self.assertFalse(self.worker_a.acquire("1"))
+            self.assertEqual(self.worker_b.held(), ["1"])
+
+    def test_release_by_non_owner(self):
+        self.worker_a.acquire("1")
+        self.worker_b.release("1")
+        self.assertFalse(self.worker_b.acquire("1"))
+        self.worker_a.release("1")
+        self.assertTrue(self.worker_b.acquire("1"))
+
+    def test_held(self):
+        self.worker_a.acquire("1")
+        self.worker_a.acquire("2")
+        self.worker_b.acquire("3")
+        self.assertEqual(sorted(self.worker_a.held()), ["1", "2"])
+        with self._later(61):
+            self.assertEqual(self.worker_a.held(), [])
+
+    def test_claim_does_not_renew(self):
+        self.assertTrue(self.worker_a.claim("play-1"))
+        self.assertFalse(self.worker_a.claim("play-1"))
+        self.assertFalse(self.worker_b.claim("play-1"))
+        with self._later(61):
+            self.assertTrue(self.worker_b.claim("play-1"))
+
+    def test_prune(self):
+        self.worker_a.acquire("1")
+        self.worker_b.acquire("2")
+        with self._later(61):
+            self.worker_a.prune()
+        self.assertEqual(datastore.count("lease"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+"""Import-time guard for the baseballclerk entry point."""
+
+import json
+import subprocess
+import sys
+import unittest
+
+
+# Generous budget for importing the entry point without its heavy dependencies.
+_MAX_IMPORT_SECONDS = 0.5
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import baseballclerk.__main__
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in ("praw", "backoff", "httpx") if m in sys.modules)
+print(json.dumps({"elapsed": elapsed, "heavy": heavy}))
+"""
+
+
+def _probe() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+class ImportTest(unittest.TestCase):
+    def test_heavy_dependencies_load_lazily(self):
+        self.assertEqual(_probe()["heavy"], [])
+
+    def test_import_time(self):
+        elapsed = _probe()["elapsed"]
+        self.assertLess(elapsed, _MAX_IMPORT_SECONDS, f"{elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    unittest.main()